@@ -5,12 +5,26 @@ moving body.
 """
 
 import matplotlib.pyplot as plt
+import numpy as np
 
 import montecarlo as mc
 
 
 def energy(mass, velocity):
-    return 0.5 * mass * velocity ** 2
+    """Return kinetic energy 0.5 * mass * velocity**2.
+
+    The calculation is done in place on a single new floating point array so
+    that mass and velocity are not modified.  It works equally on scalars,
+    whole arrays or blocks from Parameter.iter_rvs().
+    """
+    shape = np.broadcast_shapes(np.shape(mass), np.shape(velocity))
+    out = np.empty(shape, dtype=np.result_type(mass, velocity, 0.5))
+    np.square(velocity, out=out)
+    np.multiply(out, mass, out=out)
+    out *= 0.5
+
+    # Return a scalar rather than a 0-dimensional array for scalar inputs
+    return out[()]
 
 
 # Create the mass and velocity parameters
@@ -26,11 +40,12 @@ plt.show()
 energies = energy(masses.rvs, velocities.rvs)
 
 # Plot them
-plt.hist(energies, 100, normed=True)
+plt.hist(energies, 100, density=True)
 plt.xlabel('Kinetic energy')
 plt.ylabel('Probability density')
 plt.tight_layout()
 plt.show()
 
-#  Calculate the parts per million above 135
-print(mc.above(energies, 135))
+#  Calculate the parts per million above 135, one cache-sized block at a time
+blocks = map(energy, masses.iter_rvs(), velocities.iter_rvs())
+print(mc.above(blocks, 135))
@@ -17,17 +17,48 @@ Versions:
 2.0.2 - Fix typo so self.rvs reads self._rvs
 2.0.3 - Add string representation of Parameter
 2.0.4 - Add repr representation of Parameter
+2.1.0 - Generate random variates with numpy.random.Generator instead of
+        scipy.stats.norm
+2.1.1 - Count samples in above() and below() without fancy indexing
+2.2.0 - Calculate describe() statistics in one pass using numba if installed.
+        Import numba on first use
+2.3.0 - Add Parameter.iter_rvs() to generate random variates in blocks.
+        Allow above() and below() to count over an iterable of blocks
+2.4.0 - Use fast-histogram in Parameter.hist() if installed
+2.4.1 - Skip checking variates in the rvs setter when run with python -O
+2.4.2 - Use __slots__ in Parameter
+2.5.0 - Add bulk_rvs() to create random variates in parallel threads
+2.6.0 - Create random variates as float32 to halve memory use, unless
+        float32 cannot resolve them
+2.7.0 - Add above_many() to calculate ppm above many limits in one pass
+2.7.1 - Count samples in above() and below() using numba if installed
+2.8.0 - Add set_trials() and set_seed() for faster, reproducible tests
+2.8.1 - Calculate Parameter standard deviation once per generation of
+        random variates, from the current lsl and usl
+2.9.0 - Add StreamingParameter and accumulators to reduce random variates
+        without storing them
+2.9.1 - Cache the range of random variates for Parameter.hist()
+2.9.2 - Reuse a boolean array when counting samples without numba
+2.9.3 - Move unit tests to test_montecarlo.py
+2.9.4 - Build describe() results as a dict before creating the Series
 """
 
-import unittest
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import threading
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from scipy.stats import norm
 
+try:
+    from fast_histogram import histogram1d
 
-__version__ = '2.0.4'
+# fast-histogram is optional.  Without it, matplotlib's histogram is used
+except ImportError:
+    histogram1d = None
+
+__version__ = '2.9.4'
 
 MILLION = 1_000_000
 
@@ -46,12 +77,46 @@ TRIALS = MILLION
 CP = 1.33
 """Default process capability"""
 
+_RNG = np.random.default_rng()
+"""Random number generator used to create random variates"""
+
+
+def _dtype(target, std):
+    """Return the data type for random variates with mean target and
+    standard deviation std.
+
+    float32 halves memory use, but has only about 7 significant figures, so
+    its resolution relative to std coarsens as target / std grows.  Use
+    float64 when target is more than 1000 standard deviations from zero.
+    """
+    return np.float32 if abs(target) <= 1000 * abs(std) else np.float64
+
+
+def set_trials(trials):
+    """Set the number of samples for Monte Carlo simulation.
+
+    Set this before creating random variates.  Fewer trials are faster but
+    less precise: the sampling error is roughly 1 / sqrt(trials).
+    """
+    global TRIALS
+    TRIALS = trials
+
+
+def set_seed(seed=None):
+    """Seed the random number generator so that random variates are
+    reproducible.  A seed of None gives fresh, unpredictable variates.
+    """
+    global _RNG
+    _RNG = np.random.default_rng(seed)
+
 
 class Parameter:
     """Encapsulation of parameter properties such as specification limits and
     methods such as plotting.
     """
 
+    __slots__ = ('name', 'lsl', 'target', 'usl', '_rvs', '_range')
+
     def __init__(self, target, tolerance, name=''):
         """
         Args:
@@ -64,13 +129,24 @@ class Parameter:
         self.target = target
         self.usl = target + tolerance
         self.name = name
+        self._range = None
+
+    @property
+    def _std(self):
+        """Return the standard deviation for the tighter of the lower and
+        upper specification limits.
+        """
+        # http://www.itl.nist.gov/div898/handbook/pmc/section1/pmc16.htm
+        return min(self.usl - self.target, self.target - self.lsl) / (3*CP)
 
     @property
     def rvs(self):
         """Return random variates (samples from the distribution).
 
         Defaults to the normal distribution: patch or override for other
-        distributions.
+        distributions.  Generated variates are float32 to save memory,
+        unless the target is so large compared with the standard deviation
+        that float32 would quantise them.  Then they are float64.
         """
         # If the random variates have already been created, return them
         try:
@@ -78,28 +154,82 @@ class Parameter:
 
         # Else create the random variates.  This is lazy initialisation
         except AttributeError:
-            # Calculate standard deviation
-            # http://www.itl.nist.gov/div898/handbook/pmc/section1/pmc16.htm
-            std = min(self.usl - self.target, self.target - self.lsl) / (3*CP)
-            # Create random variates (rvs)
-            self.rvs = norm.rvs(self.target, std, TRIALS)
+            # Generate all at once rather than concatenating blocks, which
+            # would need an extra copy
+            self._rvs = _generate(self.target, self._std, TRIALS, _RNG)
             return self._rvs
 
     @rvs.setter
     def rvs(self, variates):
         """Set the random variates (samples from the distribution)."""
-        # Check that the type and size of the variates array is correct
-        if not (isinstance(variates, np.ndarray) and variates.size == TRIALS):
-                raise ValueError(f'variates must be an ndarray of size {TRIALS}')
+        # Check that the type and size of the variates array is correct.
+        # The check is removed when Python runs with optimisation (-O)
+        if __debug__ and not (isinstance(variates, np.ndarray)
+                              and variates.size == TRIALS
+                              and variates.dtype in (np.float32, np.float64)):
+            raise ValueError('variates must be a float32 or float64 ndarray '
+                             f'of size {TRIALS}')
 
         self._rvs = variates
+        self._range = None
+
+    @property
+    def range(self):
+        """Return the (minimum, maximum) of the random variates.
+
+        The range is cached, so set the rvs property rather than modifying the
+        random variates in place.
+        """
+        if self._range is None:
+            self._range = (self.rvs.min(), self.rvs.max())
+
+        return self._range
+
+    def iter_rvs(self, block=8192):
+        """Yield the random variates in blocks of up to block samples.
+
+        If the random variates have already been created, yield views of them.
+        Otherwise, generate each block as it is needed so that it stays in
+        cache while the caller processes it.  The generated blocks are not
+        stored, so each call yields different samples.
+        """
+        try:
+            rvs = self._rvs
+
+        except AttributeError:
+            std = self._std
+            for start in range(0, TRIALS, block):
+                size = min(block, TRIALS - start)
+                yield _generate(self.target, std, size, _RNG)
+
+        else:
+            for start in range(0, rvs.size, block):
+                yield rvs[start:start + block]
 
     def hist(self, **kwargs):
         """Create a histogram and vertical lines for lower and upper
         specification limits and target.
         """
         fig, ax = plt.subplots()
-        ax.hist(self.rvs, 100, density=True, label=self.name)
+        bins = 100
+
+        if histogram1d is None:
+            ax.hist(self.rvs, bins, range=self.range, density=True,
+                    label=self.name)
+
+        else:
+            # Bins are uniform so count them directly rather than searching.
+            # The range of histogram1d excludes its upper limit, so extend it
+            # slightly to include the maximum random variate
+            lo, hi = self.range
+            hi = np.nextafter(hi, np.inf)
+            counts = histogram1d(self.rvs, bins=bins, range=(lo, hi))
+            width = (hi - lo) / bins
+            density = counts / (counts.sum() * width)
+            edges = np.linspace(lo, hi, bins + 1)
+            ax.bar(edges[:-1], density, width=width, align='edge',
+                   label=self.name)
+
         ax.axvline(self.lsl, color='m', label='Lower spec limit')
         ax.axvline(self.usl, color='r', label='Upper spec limit')
         ax.axvline(self.target, color='g', label='Target')
@@ -120,60 +250,377 @@ class Parameter:
         return str(self)
 
 
+def _generate(target, std, size, rng):
+    """Return normal random variates using random number generator rng."""
+    # Scale and shift in place to avoid temporary arrays
+    rvs = rng.standard_normal(size, dtype=_dtype(target, std))
+    rvs *= std
+    rvs += target
+    return rvs
+
+
+def bulk_rvs(params, threads=None):
+    """Create the random variates of each Parameter in params in parallel.
+
+    Each Parameter is processed by a separate task with its own independent
+    random number generator.  NumPy releases the GIL while generating random
+    variates, so threads run in parallel without the cost of starting
+    processes.
+
+    Args:
+        params: a sequence of Parameters
+        threads: the maximum number of worker threads.  Defaults to
+            ThreadPoolExecutor's default
+    """
+    rngs = _RNG.spawn(len(params))
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [executor.submit(_generate, p.target, p._std, TRIALS, rng)
+                   for p, rng in zip(params, rngs)]
+        results = [future.result() for future in futures]
+
+    for p, rvs in zip(params, results):
+        p.rvs = rvs
+
+
+# Each thread has its own scratch array so that counting is thread safe
+_scratch = threading.local()
+
+
+def _bool_scratch(size):
+    """Return a reusable boolean array of size for the current thread."""
+    buffer = getattr(_scratch, 'buffer', None)
+    if buffer is None or buffer.size < size:
+        buffer = _scratch.buffer = np.empty(size, dtype=bool)
+
+    return buffer[:size]
+
+
+# The NumPy functions compare in float64, like the numba kernels.  Otherwise
+# NumPy would cast a Python float limit to float32 for float32 arrays
+def _numpy_count_above(arr, limit):
+    """Return the number of samples in 1D array arr above limit."""
+    return np.count_nonzero(
+        np.greater(arr, np.float64(limit), out=_bool_scratch(arr.size)))
+
+
+def _numpy_count_below(arr, limit):
+    """Return the number of samples in 1D array arr below limit."""
+    return np.count_nonzero(
+        np.less(arr, np.float64(limit), out=_bool_scratch(arr.size)))
+
+
+def _numpy_stats(arr, minimum, maximum):
+    """Return the mean, sample variance, count below minimum and count
+    above maximum of 1D array arr.
+    """
+    return (arr.mean(dtype=np.float64), arr.var(ddof=1, dtype=np.float64),
+            _numpy_count_below(arr, minimum), _numpy_count_above(arr, maximum))
+
+
+def _numba_kernels():
+    """Return numba versions of the count above, count below and statistics
+    functions.  Raise ImportError if numba is not installed.
+    """
+    from numba import njit, prange
+
+    @njit(parallel=True, cache=True)
+    def count_above(arr, limit):
+        count = 0
+        for i in prange(arr.size):
+            if arr[i] > limit:
+                count += 1
+
+        return count
+
+    @njit(parallel=True, cache=True)
+    def count_below(arr, limit):
+        count = 0
+        for i in prange(arr.size):
+            if arr[i] < limit:
+                count += 1
+
+        return count
+
+    # NumPy's error model gives NaN rather than ZeroDivisionError for fewer
+    # than 2 samples
+    @njit(parallel=True, cache=True, error_model='numpy')
+    def stats(arr, minimum, maximum):
+        n = arr.size
+
+        # Sum deviations from the first sample to avoid losing precision
+        shift = float(arr[0]) if n else 0.0
+        total = 0.0
+        squares = 0.0
+        n_below = 0
+        n_above = 0
+        for i in prange(n):
+            v = arr[i]
+            d = v - shift
+            total += d
+            squares += d * d
+            if v < minimum:
+                n_below += 1
+            if v > maximum:
+                n_above += 1
+
+        mean = shift + total / n
+        var = (squares - total * total / n) / (n - 1)
+        return mean, var, n_below, n_above
+
+    return count_above, count_below, stats
+
+
+@functools.lru_cache(maxsize=None)
+def _kernels():
+    """Return the count above, count below and statistics functions.
+
+    numba is optional and slow to import, so it is imported on first use.
+    Without it, the NumPy equivalents are used.
+    """
+    try:
+        return _numba_kernels()
+
+    except ImportError:
+        return _numpy_count_above, _numpy_count_below, _numpy_stats
+
+
+def _count_above(arr, limit):
+    """Return the number of samples in 1D array arr above limit."""
+    return _kernels()[0](arr, limit)
+
+
+def _count_below(arr, limit):
+    """Return the number of samples in 1D array arr below limit."""
+    return _kernels()[1](arr, limit)
+
+
+def _stats(arr, minimum, maximum):
+    """Return the mean, sample variance, count below minimum and count
+    above maximum of 1D array arr in a single pass.
+    """
+    return _kernels()[2](arr, minimum, maximum)
+
+
+def _count(arr, counter, limit):
+    """Return counter(arr, limit) and the total number of samples in array or
+    iterable of arrays arr.
+    """
+    # Array-like objects such as pandas.Series are a single block
+    if hasattr(arr, '__array__'):
+        arr = (arr,)
+
+    count = 0
+    size = 0
+    for chunk in arr:
+        chunk = np.ravel(chunk)
+        count += counter(chunk, limit)
+        size += chunk.size
+
+    return count, size
+
+
 def above(arr, maximum):
-    """Return the parts per million in array arr above maximum."""
-    return MILLION * arr[arr > maximum].size / arr.size
+    """Return the parts per million in array arr above maximum.
+
+    arr may be any array-like object such as a pandas.Series, or an iterable
+    of arrays such as Parameter.iter_rvs().
+    """
+    count, size = _count(arr, _count_above, maximum)
+    return MILLION * count / size
+
+
+def above_many(arr, maximums):
+    """Return a dict of the parts per million in array arr above each of
+    maximums.
+
+    The samples are binned once between the maximums and the bins counted, so
+    the array is read only once however many maximums there are.  Evenly
+    spaced maximums are binned by arithmetic; others by binary search.
+    Samples within floating point resolution of an evenly spaced maximum may
+    be counted in the neighbouring bin.
+    """
+    arr = np.ravel(arr)
+    t = np.sort(np.asarray(maximums, dtype=np.float64))
+    k = t.size
+    step = (t[-1] - t[0]) / (k - 1) if k > 1 else 0
+
+    # Only use arithmetic if the maximums are evenly spaced to within a few
+    # units in the last place; small errors in spacing accumulate over bins
+    even = step > 0 and np.allclose(np.linspace(t[0], t[-1], k), t,
+                                    rtol=4 * np.finfo(np.float64).eps, atol=0)
+
+    # Index of each sample is the number of maximums strictly below it.
+    # NaN is not above any maximum, as for above(), so its index is 0
+    nan = np.isnan(arr)
+    if even:
+        idx = np.ceil((arr - t[0]) / step)
+        np.clip(idx, 0, k, out=idx)
+        idx[nan] = 0
+        idx = idx.astype(np.intp)
+
+    else:
+        idx = np.searchsorted(t, arr, side='left')
+        idx[nan] = 0
+
+    # Samples above maximum j are those with index greater than j
+    counts = np.bincount(idx, minlength=k + 1)
+    ppm = MILLION * np.cumsum(counts[::-1])[::-1][1:] / arr.size
+    return dict(zip(t.tolist(), ppm.tolist()))
 
 
 def below(arr, minimum):
-    """Return the parts per million in array arr below minimum."""
-    return MILLION * arr[arr < minimum].size / arr.size
+    """Return the parts per million in array arr below minimum.
+
+    arr may be any array-like object such as a pandas.Series, or an iterable
+    of arrays such as Parameter.iter_rvs().
+    """
+    count, size = _count(arr, _count_below, minimum)
+    return MILLION * count / size
 
 
 def describe(results, units='', lsl=None, usl=None):
     """Return useful statistics as a pandas.Series."""
-    res = pd.Series()
-    res[f'Median ({units})'] = np.median(results)
-    res[f'Mean ({units})'] = results.mean()
+    arr = np.ravel(results)
+    minimum = -np.inf if lsl is None else float(lsl)
+    maximum = np.inf if usl is None else float(usl)
 
     # Use 1 degree of freedom because this is a sample, not a population
-    res[f'Standard deviation ({units})'] = results.std(ddof=1)
+    mean, var, n_below, n_above = _stats(arr, minimum, maximum)
+
+    res = {}
+    res[f'Median ({units})'] = np.median(arr)
+    res[f'Mean ({units})'] = mean
+    res[f'Standard deviation ({units})'] = np.sqrt(var)
 
     if lsl is not None:
-        res[f'ppm below {lsl} {units}'] = below(results, lsl)
+        res[f'ppm below {lsl} {units}'] = MILLION * n_below / arr.size
 
     if usl is not None:
-        res[f'ppm above {usl} {units}'] = above(results, usl)
+        res[f'ppm above {usl} {units}'] = MILLION * n_above / arr.size
+
+    return pd.Series(res)
+
+
+class StreamingParameter(Parameter):
+    """Parameter whose random variates are reduced block by block by
+    accumulators such as MomentAccumulator, TailCounter and UniformHistogram.
+
+    Memory use depends on the block size rather than TRIALS, so very large
+    simulations fit in memory.  Accessing the rvs property still creates and
+    stores all the random variates.
+    """
 
-    return res
+    __slots__ = ()
 
+    def reduce(self, *accumulators, block=65536):
+        """Pass each block of random variates to the update() method of each
+        of accumulators.  Return the accumulators.
+        """
+        for chunk in self.iter_rvs(block):
+            for accumulator in accumulators:
+                accumulator.update(chunk)
+
+        return accumulators
+
+
+class MomentAccumulator:
+    """Accumulate the mean and standard deviation of blocks of samples."""
+
+    def __init__(self):
+        self.size = 0
+        self.mean = 0.0
+        # Sum of squared deviations from the mean
+        self._squares = 0.0
+
+    def update(self, chunk):
+        """Add the samples in array chunk."""
+        size = chunk.size
+        if not size:
+            return
+
+        mean = chunk.mean(dtype=np.float64)
+        squares = chunk.var(dtype=np.float64) * size
+
+        # Combine with previous blocks using Chan et al.'s parallel algorithm
+        # https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance
+        total = self.size + size
+        delta = mean - self.mean
+        self.mean += delta * size / total
+        self._squares += squares + delta**2 * self.size * size / total
+        self.size = total
+
+    @property
+    def std(self):
+        """Return the sample standard deviation, or NaN for fewer than 2
+        samples as for describe().
+        """
+        if self.size < 2:
+            return np.nan
+
+        # Use 1 degree of freedom because this is a sample, not a population
+        return np.sqrt(self._squares / (self.size - 1))
+
+
+class TailCounter:
+    """Accumulate the parts per million of samples above (or below) a limit.
+    """
 
-# Unit tests
-class TestParameter(unittest.TestCase):
+    def __init__(self, limit, above=True):
+        """
+        Args:
+            limit: the specification limit
+            above: count samples above limit if True, else below limit
+        """
+        self.limit = limit
+        self.count = 0
+        self.size = 0
+        self._counter = _count_above if above else _count_below
+
+    def update(self, chunk):
+        """Add the samples in array chunk."""
+        self.count += self._counter(np.ravel(chunk), self.limit)
+        self.size += chunk.size
+
+    @property
+    def ppm(self):
+        """Return the parts per million beyond the limit."""
+        return MILLION * self.count / self.size
 
-    def test_rvs(self):
-        target = 20
-        tol = 2
-        places = 2  # Resolution in decimal places
-        p = Parameter(target, tol)
 
-        #  Test mean is near target
-        self.assertAlmostEqual(target, p.rvs.mean(), places)
+class UniformHistogram:
+    """Accumulate a histogram of samples in evenly spaced bins.
 
-        # Test standard deviation is approximately correct
-        expected = tol / (3 * CP)
-        self.assertAlmostEqual(expected, p.rvs.std(ddof=1), places)
+    Each bin includes its lower edge but not its upper edge, as for
+    fast-histogram, so samples equal to hi are not counted.
+    """
 
+    def __init__(self, lo, hi, bins=100):
+        """
+        Args:
+            lo: lower edge of the first bin
+            hi: upper edge of the last bin
+            bins: number of bins
+        """
+        self.range = (lo, hi)
+        self.counts = np.zeros(bins, dtype=np.int64)
 
-class TestAbove(unittest.TestCase):
+    def update(self, chunk):
+        """Add the samples in array chunk.  Samples outside the range are
+        ignored.
+        """
+        bins = self.counts.size
+        if histogram1d is None:
+            counts, _ = np.histogram(chunk, bins, self.range)
 
-    def test_above(self):
-        # Array of 1000 equispaced numbers
-        arr = np.linspace(0, 1000, 1000)
+            # np.histogram includes hi in the last bin, so remove it
+            counts[-1] -= np.count_nonzero(chunk == self.range[1])
 
-        # Assert ppm above 900.  100 samples in 1000 is 100000
-        self.assertEqual(100000, above(arr, 900))
+        else:
+            counts = histogram1d(chunk, bins=bins, range=self.range)
 
+        self.counts += counts.astype(np.int64)
 
-if __name__ == '__main__':
-    unittest.main()
+    @property
+    def edges(self):
+        """Return the bin edges."""
+        return np.linspace(*self.range, self.counts.size + 1)
@@ -0,0 +1,259 @@
+"""Unit tests for the montecarlo module."""
+
+import unittest
+from unittest import mock
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+import montecarlo as mc
+
+# Draw plots without a display
+matplotlib.use('Agg')
+
+
+class SmallTrialsTestCase(unittest.TestCase):
+    """Base class for tests using fewer, reproducible random variates."""
+
+    def setUp(self):
+        mc.set_trials(100_000)
+        mc.set_seed(0)
+
+    def tearDown(self):
+        mc.set_trials(mc.MILLION)
+        mc.set_seed()
+
+
+class TestParameter(SmallTrialsTestCase):
+
+    def test_rvs(self):
+        target = 20
+        tol = 2
+        places = 2  # Resolution in decimal places
+        p = mc.Parameter(target, tol)
+
+        #  Test mean is near target
+        self.assertAlmostEqual(target, p.rvs.mean(), places)
+
+        # Test standard deviation is approximately correct
+        expected = tol / (3 * mc.CP)
+        self.assertAlmostEqual(expected, p.rvs.std(ddof=1), places)
+
+    def test_asymmetric_tolerance(self):
+        p = mc.Parameter(20, 2)
+        p.usl = 21
+
+        # The tighter upper tolerance sets the standard deviation
+        expected = 1 / (3 * mc.CP)
+        self.assertAlmostEqual(expected, p.rvs.std(ddof=1), 2)
+
+    def test_rvs_dtype(self):
+        # float32 is precise enough for small targets
+        self.assertEqual(np.float32, mc.Parameter(20, 2).rvs.dtype)
+
+        # float64 is used when float32 would quantise the random variates
+        rvs = mc.Parameter(1000, 0.01).rvs
+        self.assertEqual(np.float64, rvs.dtype)
+        self.assertEqual(mc.TRIALS, np.unique(rvs).size)
+
+    def test_iter_rvs(self):
+        p = mc.Parameter(20, 2)
+
+        # Before rvs are created, blocks are generated on the fly
+        self.assertEqual(mc.TRIALS, sum(chunk.size for chunk in p.iter_rvs()))
+
+        # After rvs are created, blocks are views of them
+        rvs = p.rvs
+        np.testing.assert_array_equal(rvs, np.concatenate(list(p.iter_rvs())))
+
+    def test_range(self):
+        p = mc.Parameter(20, 2)
+        self.assertEqual((p.rvs.min(), p.rvs.max()), p.range)
+
+        # Setting the random variates resets the range
+        p.rvs = np.linspace(0, 1, mc.TRIALS)
+        self.assertEqual((0, 1), p.range)
+
+    def test_hist(self):
+        p = mc.Parameter(20, 2)
+
+        # The maximum is alone in the last bin
+        rvs = np.zeros(mc.TRIALS)
+        rvs[-1] = 1
+        p.rvs = rvs
+
+        # Test with and without fast-histogram
+        for histogram1d in (mc.histogram1d, None):
+            with mock.patch.object(mc, 'histogram1d', histogram1d):
+                ax = p.hist()
+
+            bars = ax.patches
+            area = sum(bar.get_height() * bar.get_width() for bar in bars)
+            self.assertAlmostEqual(1, area)
+            self.assertGreater(bars[-1].get_height(), 0)
+            plt.close(ax.figure)
+
+    def test_set_seed(self):
+        mc.set_seed(1)
+        first = mc.Parameter(20, 2).rvs
+        mc.set_seed(1)
+        np.testing.assert_array_equal(first, mc.Parameter(20, 2).rvs)
+
+    def test_rvs_setter(self):
+        p = mc.Parameter(20, 2)
+        p.rvs = np.zeros(mc.TRIALS, dtype=np.float32)
+        self.assertEqual(np.float32, p.rvs.dtype)
+
+        with self.assertRaises(ValueError):
+            p.rvs = np.zeros(mc.TRIALS, dtype=int)
+
+
+class TestBulkRvs(SmallTrialsTestCase):
+
+    def test_bulk_rvs(self):
+        params = [mc.Parameter(20, 2), mc.Parameter(10, 1)]
+        mc.bulk_rvs(params, threads=2)
+
+        for p in params:
+            self.assertEqual(mc.TRIALS, p.rvs.size)
+            self.assertAlmostEqual(p.target, p.rvs.mean(), 2)
+
+        # Each Parameter has independent random variates
+        deviations = [(p.rvs - p.target) / (p.usl - p.target) for p in params]
+        self.assertFalse(np.allclose(*deviations))
+
+
+class TestStreamingParameter(SmallTrialsTestCase):
+
+    def test_reduce(self):
+        moments = mc.MomentAccumulator()
+        tail = mc.TailCounter(21)
+        hist = mc.UniformHistogram(18, 22)
+        mc.StreamingParameter(20, 2).reduce(moments, tail, hist, block=8192)
+
+        # The same seed and block size give the same random variates
+        mc.set_seed(0)
+        rvs = mc.Parameter(20, 2).rvs
+
+        self.assertEqual(mc.TRIALS, moments.size)
+        self.assertAlmostEqual(rvs.mean(dtype=np.float64), moments.mean)
+        self.assertAlmostEqual(rvs.std(ddof=1, dtype=np.float64), moments.std)
+        self.assertEqual(mc.above(rvs, 21), tail.ppm)
+        inside = np.count_nonzero((rvs >= 18) & (rvs < 22))
+        self.assertEqual(inside, hist.counts.sum())
+
+
+class TestMomentAccumulator(unittest.TestCase):
+
+    def test_few_samples(self):
+        moments = mc.MomentAccumulator()
+        self.assertTrue(np.isnan(moments.std))
+
+        moments.update(np.array([5.0]))
+        self.assertEqual(5, moments.mean)
+        self.assertTrue(np.isnan(moments.std))
+
+
+class TestUniformHistogram(unittest.TestCase):
+
+    def test_upper_limit(self):
+        # The upper limit is excluded with and without fast-histogram
+        for histogram1d in (mc.histogram1d, None):
+            with mock.patch.object(mc, 'histogram1d', histogram1d):
+                hist = mc.UniformHistogram(18, 22, 4)
+                hist.update(np.array([18.0, 20.0, 22.0]))
+
+            np.testing.assert_array_equal([1, 0, 1, 0], hist.counts)
+
+
+class TestAbove(unittest.TestCase):
+
+    def test_above(self):
+        # Array of 1000 equispaced numbers
+        arr = np.linspace(0, 1000, 1000)
+
+        # Assert ppm above 900.  100 samples in 1000 is 100000
+        self.assertEqual(100000, mc.above(arr, 900))
+
+    def test_above_many(self):
+        arr = np.linspace(0, 1000, 1000)
+
+        # Evenly and unevenly spaced maximums
+        for maximums in ([900.5, 100.5, 500.5], [0.5, 1.5, 950.5, -1, 2000]):
+            expected = {m: mc.above(arr, m) for m in maximums}
+            self.assertEqual(expected, mc.above_many(arr, maximums))
+
+    def test_above_many_nan(self):
+        arr = np.linspace(0, 1000, 1000)
+        arr[::10] = np.nan
+
+        # NaN is not above any maximum for evenly and unevenly spaced maximums
+        for maximums in ([100.5, 500.5, 900.5], [0.5, 1.5, 950.5]):
+            expected = {m: mc.above(arr, m) for m in maximums}
+            self.assertEqual(expected, mc.above_many(arr, maximums))
+
+    def test_above_many_nearly_even(self):
+        rng = np.random.default_rng(0)
+
+        # Gaps between maximums are 1 +/- 9e-6: not quite evenly spaced
+        maximums = np.cumsum(1 + rng.uniform(-9e-6, 9e-6, 1000))
+        arr = rng.uniform(0, 1001, 1_000_000)
+
+        expected = [mc.above(arr, m) for m in maximums]
+        result = mc.above_many(arr, maximums)
+        np.testing.assert_array_equal(maximums, list(result))
+        np.testing.assert_array_equal(expected, list(result.values()))
+
+    def test_above_series(self):
+        series = pd.Series(np.linspace(0, 1000, 1000))
+        self.assertEqual(100000, mc.above(series, 900))
+        self.assertEqual(100000, mc.below(series, 100))
+
+    def test_above_blocks(self):
+        arr = np.linspace(0, 1000, 1000)
+        self.assertEqual(100000, mc.above(np.array_split(arr, 7), 900))
+
+
+class TestKernels(unittest.TestCase):
+
+    def test_float32(self):
+        # float32(0.1) is slightly greater than 0.1 in float64
+        arr = np.full(10, np.float32(0.1))
+
+        # NumPy and numba kernels agree, comparing in float64
+        kernels = [(mc._numpy_count_above, mc._numpy_count_below,
+                    mc._numpy_stats)]
+        try:
+            kernels.append(mc._numba_kernels())
+
+        except ImportError:
+            pass
+
+        for count_above, count_below, stats in kernels:
+            self.assertEqual(10, count_above(arr, 0.1))
+            self.assertEqual(0, count_below(arr, 0.1))
+            self.assertEqual((0, 10), stats(arr, 0.1, 0.1)[2:])
+
+
+class TestDescribe(unittest.TestCase):
+
+    def test_describe(self):
+        arr = np.linspace(0, 1000, 1000)
+        res = mc.describe(arr, 'mm', lsl=100, usl=900)
+
+        self.assertAlmostEqual(500, res['Median (mm)'])
+        self.assertAlmostEqual(500, res['Mean (mm)'])
+        self.assertAlmostEqual(arr.std(ddof=1), res['Standard deviation (mm)'])
+        self.assertEqual(100000, res['ppm below 100 mm'])
+        self.assertEqual(100000, res['ppm above 900 mm'])
+
+    def test_describe_one_sample(self):
+        res = mc.describe(np.array([5.0]), 'mm')
+        self.assertEqual(5, res['Mean (mm)'])
+        self.assertTrue(np.isnan(res['Standard deviation (mm)']))
+
+
+if __name__ == '__main__':
+    unittest.main()